@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# Runs the generated KWin sampling script under node against a stub workspace
+# and checks that the Python side can read its output back.
+import json
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import kwin_dashboard as kd
+
+HARNESS = """
+const fs = require("fs");
+const fixture = JSON.parse(fs.readFileSync(process.argv[2], "utf8"));
+const outputs = fixture.outputs;
+const desktops = fixture.desktops.map((name) => ({ name: name }));
+const wins = fixture.windows.map((w) => Object.assign({ managed: true }, w, {
+  output: outputs[w.output],
+  desktops: w.desktops.map((i) => desktops[i]),
+}));
+globalThis.workspace = {
+  stackingOrder: wins,
+  outputs: outputs,
+  desktops: desktops,
+  currentDesktop: desktops[0],
+  activeClient: fixture.active === null ? null : wins[fixture.active],
+};
+globalThis.print = (s) => console.log(s);
+eval(fs.readFileSync(process.argv[3], "utf8"));
+"""
+
+def make_fixture(count: int, active: int | None) -> dict:
+    return {
+        "outputs": [
+            {"name": "DP-1", "geometry": {"x": 0, "y": 0, "width": 1920, "height": 1080}},
+            {"name": "DP-2", "geometry": {"x": 1920, "y": 0, "width": 1920, "height": 1080}},
+        ],
+        "desktops": ["D1", "D2"],
+        "windows": [
+            {
+                "internalId": "{%08d-0000-0000-0000-000000000000}" % i,
+                "pid": 100 + i,
+                "caption": "Árvíztűrő tükörfúrógép %d " % i + "x" * 300,
+                "resourceClass": "app%d" % i,
+                "output": i % 2,
+                "desktops": [i % 2],
+                "fullScreen": i == 1,
+            }
+            for i in range(count)
+        ],
+        "active": active,
+    }
+
+def run_script(node: str, fixture: dict, js_code: str) -> list[str]:
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = {}
+        for name, content in (("harness.js", HARNESS), ("fixture.json", json.dumps(fixture)), ("script.js", js_code)):
+            paths[name] = f"{tmp}/{name}"
+            with open(paths[name], "w") as f:
+                f.write(content)
+        proc = subprocess.run(
+            [node, paths["harness.js"], paths["fixture.json"], paths["script.js"]],
+            capture_output=True, text=True,
+        )
+    if proc.returncode:
+        raise AssertionError(f"generated script failed:\n{proc.stderr}")
+    return proc.stdout.splitlines()
+
+def check_sample(node: str) -> None:
+    fixture = make_fixture(3, active=1)
+    meta, windows = kd.parse_state_lines(run_script(node, fixture, kd.build_js(None)))
+    assert meta.get("activeDesktopName") == "D1", meta
+    assert len(windows) == 3, windows
+    assert [w["active"] for w in windows] == [False, True, False], windows
+
+    meta, windows = kd.parse_state_lines(run_script(node, make_fixture(3, active=None), kd.build_js(None)))
+    assert meta and len(windows) == 3 and not any(w["active"] for w in windows), windows
+
+def check_split_sample(node: str) -> None:
+    lines = run_script(node, make_fixture(300, active=0), kd.build_js(None))
+    assert len(lines) > 1, "expected the sample to be split"
+    longest = max(len(line.encode("utf-8")) for line in lines)
+    assert longest < 48 * 1024, longest
+    meta, windows = kd.parse_state_lines(lines)
+    assert meta and len(windows) == 300, len(windows)
+
+def check_partial_sample(node: str) -> None:
+    # A partly flushed sample must be waited for, never read as window rows.
+    lines = run_script(node, make_fixture(300, active=0), kd.build_js(None))
+    partial = lines[:-1]
+    assert kd.state_lines_ready(lines) and not kd.state_lines_ready(partial)
+    assert kd.parse_state_lines(partial) == ({}, []), "partial sample parsed as windows"
+
+def check_targeted_sample(node: str) -> None:
+    # MoveWindow re-samples a single window by id; case and braces may differ.
+    fixture = make_fixture(3, active=1)
+    target = fixture["windows"][1]["internalId"]
+    query = target.strip("{}").upper()
+    _, moved = kd.parse_state_lines(run_script(node, fixture, kd.build_js(None, query)))
+    assert [w["internalId"] for w in moved] == [target], moved
+    moved_win = kd.find_window_for_id(moved, target)
+    assert moved_win and moved_win["fullScreen"], moved_win
+
+def main() -> int:
+    node = shutil.which("node")
+    if not node:
+        print("node not found; skipping generated script checks")
+        return 0
+    for check in (check_sample, check_split_sample, check_partial_sample, check_targeted_sample):
+        check(node)
+        print(f"ok {check.__name__}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,28 +1,61 @@
 #!/usr/bin/env python3
 import argparse
 import asyncio
+import atexit
+import functools
 import json
 import re
 import os
 import shutil
 import subprocess
 import shlex
+import signal
 import tempfile
 import time
 from datetime import datetime, timezone
+from typing import Callable, Iterable, NamedTuple
+
+try:
+    import orjson
+except ImportError:  # optional speedup
+    orjson = None
+
+# orjson.JSONDecodeError subclasses json.JSONDecodeError, so callers catch the latter.
+json_loads = orjson.loads if orjson else json.loads
+
+def json_dumps(obj) -> str:
+    # Returned as str so WebSocket messages stay text frames.
+    if orjson:
+        return orjson.dumps(obj).decode("utf-8")
+    # \u escapes are valid JSON for the client and the ASCII encoder is faster.
+    return json.dumps(obj, separators=(",", ":"))
+
+_LEADING_SPACES_RE = re.compile(r"^ +", re.MULTILINE)
+
+def json_dumps_pretty(obj) -> str:
+    if orjson:
+        # orjson only indents by two; double it to keep the four-space layout.
+        text = orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode("utf-8")
+        return _LEADING_SPACES_RE.sub(lambda m: m.group(0) * 2, text)
+    return json.dumps(obj, ensure_ascii=False, indent=4)
 
 def which_any(*names: str) -> str | None:
+    return _which_any_cached(names)
+
+# PATH does not change while the process runs, so lookups are cached.
+@functools.lru_cache(maxsize=None)
+def _which_any_cached(names: tuple[str, ...]) -> str | None:
     for n in names:
         p = shutil.which(n)
         if p:
             return p
     return None
 
-def get_kwin_support_info() -> str | None:
+async def get_kwin_support_info() -> str | None:
     qdbus = which_any("qdbus", "qdbus6")
     if qdbus:
         try:
-            cp = run([qdbus, "org.kde.KWin", "/KWin", "org.kde.KWin.supportInformation"])
+            cp = await run_async([qdbus, "org.kde.KWin", "/KWin", "org.kde.KWin.supportInformation"])
             return cp.stdout
         except subprocess.CalledProcessError:
             return None
@@ -30,7 +63,7 @@ def get_kwin_support_info() -> str | None:
     gdbus = which_any("gdbus")
     if gdbus:
         try:
-            cp = run([
+            cp = await run_async([
                 gdbus, "call", "--session",
                 "--dest", "org.kde.KWin",
                 "--object-path", "/KWin",
@@ -42,32 +75,26 @@ def get_kwin_support_info() -> str | None:
 
     return None
 
+# One "Screen N:" block: optional Name line, then the Geometry line. The
+# filler lines never cross into the next screen's block.
+_SCREEN_FILLER = r"(?:(?![ \t]*Screen \d+:)[^\n]*\n)*?"
+_SCREENS_RE = re.compile(
+    r"^[ \t]*Screen (\d+):[^\n]*\n"
+    + _SCREEN_FILLER
+    + r"(?:[ \t]*Name:[ \t]*([^\n]*)\n" + _SCREEN_FILLER + r")?"
+    + r"[ \t]*Geometry:[ \t]*(\d+),(\d+),(\d+)x(\d+)",
+    re.MULTILINE,
+)
+
 def parse_screens_from_support_info(text: str) -> list[dict]:
     screens = []
-    current: dict | None = None
-    for raw in text.splitlines():
-        line = raw.strip()
-        m = re.match(r"Screen (\d+):", line)
-        if m:
-            if current and "x" in current:
-                screens.append(current)
-            current = {"index": int(m.group(1))}
-            continue
-        if not current:
-            continue
-        if line.startswith("Name:"):
-            current["name"] = line.split(":", 1)[1].strip()
-            continue
-        if line.startswith("Geometry:"):
-            gm = re.search(r"Geometry:\s*(\d+),(\d+),(\d+)x(\d+)", line)
-            if gm:
-                current["x"] = int(gm.group(1))
-                current["y"] = int(gm.group(2))
-                current["width"] = int(gm.group(3))
-                current["height"] = int(gm.group(4))
-            continue
-    if current and "x" in current:
-        screens.append(current)
+    for m in _SCREENS_RE.finditer(text):
+        idx, name, x, y, width, height = m.groups()
+        screen = {"index": int(idx)}
+        if name is not None:
+            screen["name"] = name.strip()
+        screen.update(x=int(x), y=int(y), width=int(width), height=int(height))
+        screens.append(screen)
     return screens
 
 def normalize_winid(winid: str | None) -> str:
@@ -75,20 +102,19 @@ def normalize_winid(winid: str | None) -> str:
         return ""
     return winid.strip().lower().strip("{}")
 
+_WINDOW_ID_KEYS = ("internalId", "windowId", "id")
+
 def find_window_for_id(windows: list[dict], winid: str | None) -> dict | None:
     target = normalize_winid(winid)
     if not target:
         return None
     for w in windows:
-        if normalize_winid(w.get("internalId")) == target:
-            return w
-        if normalize_winid(w.get("windowId")) == target:
-            return w
-        if normalize_winid(w.get("id")) == target:
-            return w
+        for key in _WINDOW_ID_KEYS:
+            if normalize_winid(w.get(key)) == target:
+                return w
     return None
 
-def switch_to_screen_for_window(windows: list[dict], winid: str | None) -> None:
+async def switch_to_screen_for_window(windows: list[dict], winid: str | None) -> None:
     w = find_window_for_id(windows, winid)
     if not w:
         return
@@ -98,7 +124,7 @@ def switch_to_screen_for_window(windows: list[dict], winid: str | None) -> None:
     cx = fg.get("x", 0) + (fg.get("width", 0) / 2)
     cy = fg.get("y", 0) + (fg.get("height", 0) / 2)
 
-    info = get_kwin_support_info()
+    info = await get_kwin_support_info()
     if not info:
         return
     screens = parse_screens_from_support_info(info)
@@ -115,38 +141,60 @@ def switch_to_screen_for_window(windows: list[dict], winid: str | None) -> None:
             break
     if idx is None:
         return
-    if invoke_kwin_shortcut(f"Switch to Screen {idx}"):
+    if await invoke_kwin_shortcut(f"Switch to Screen {idx}"):
         return
-    invoke_kwin_shortcut(f"Switch to Screen {idx + 1}")
+    await invoke_kwin_shortcut(f"Switch to Screen {idx + 1}")
 
-def find_window_fullscreen(payload_state: dict, window_id: str) -> bool:
-    for monitor in payload_state.get("monitors") or []:
-        for desktop in monitor.get("desktops") or []:
-            for win in desktop.get("windows") or []:
-                if win.get("id") == window_id:
-                    return bool(win.get("fullScreen"))
-    return False
+class PayloadIndex(NamedTuple):
+    # window id -> (monitor id, fullScreen, on_all_desktops)
+    by_win: dict[str, tuple[int | None, bool, bool]]
+    # monitor id -> window ids on that monitor
+    by_monitor: dict[int | None, list[str]]
 
-def find_window_monitor(payload_state: dict, window_id: str) -> int | None:
+def index_payload_state(payload_state: dict) -> PayloadIndex:
+    by_win: dict[str, tuple[int | None, bool, bool]] = {}
+    by_monitor: dict[int | None, list[str]] = {}
     for monitor in payload_state.get("monitors") or []:
         monitor_id = monitor.get("monitor_id") or monitor.get("monitorId")
+        monitor_wins = by_monitor.setdefault(monitor_id, [])
         for desktop in monitor.get("desktops") or []:
             for win in desktop.get("windows") or []:
-                if win.get("id") == window_id:
-                    return monitor_id
-    return None
-
-def find_window_pinned(payload_state: dict, window_id: str) -> bool | None:
-    for monitor in payload_state.get("monitors") or []:
-        for desktop in monitor.get("desktops") or []:
-            for win in desktop.get("windows") or []:
-                if win.get("id") == window_id:
-                    return bool(win.get("on_all_desktops"))
-    return None
-
-def is_monitor_all_pinned(payload_state: dict, monitor_id: int | None) -> bool:
+                win_id = win.get("id")
+                if win_id in by_win:
+                    continue
+                by_win[win_id] = (monitor_id, bool(win.get("fullScreen")), bool(win.get("on_all_desktops")))
+                monitor_wins.append(win_id)
+    return PayloadIndex(by_win, by_monitor)
+
+def find_window_fullscreen(payload_state: dict, window_id: str, index: PayloadIndex | None = None) -> bool:
+    if index is None:
+        index = index_payload_state(payload_state)
+    entry = index.by_win.get(window_id)
+    return entry[1] if entry else False
+
+def find_window_monitor(payload_state: dict, window_id: str, index: PayloadIndex | None = None) -> int | None:
+    if index is None:
+        index = index_payload_state(payload_state)
+    entry = index.by_win.get(window_id)
+    return entry[0] if entry else None
+
+def find_window_pinned(payload_state: dict, window_id: str, index: PayloadIndex | None = None) -> bool | None:
+    if index is None:
+        index = index_payload_state(payload_state)
+    entry = index.by_win.get(window_id)
+    return entry[2] if entry else None
+
+def is_monitor_all_pinned(payload_state: dict, monitor_id: int | None, index: PayloadIndex | None = None) -> bool:
     if monitor_id is None:
         return False
+    if index is not None:
+        win_ids = index.by_monitor.get(monitor_id)
+        if not win_ids:
+            return False
+        return all(index.by_win[w][2] for w in win_ids)
+
+    # Without an index, walk the target monitor lazily and stop at the first
+    # unpinned window.
     target = None
     for monitor in payload_state.get("monitors") or []:
         mid = monitor.get("monitor_id") or monitor.get("monitorId")
@@ -155,21 +203,40 @@ def is_monitor_all_pinned(payload_state: dict, monitor_id: int | None) -> bool:
             break
     if not target:
         return False
-    windows = []
-    for desktop in target.get("desktops") or []:
-        windows.extend(desktop.get("windows") or [])
-    if not windows:
+    desktops = target.get("desktops") or []
+    if not any(d.get("windows") for d in desktops):
         return False
-    return all(w.get("on_all_desktops") for w in windows)
+    return all(w.get("on_all_desktops") for d in desktops for w in (d.get("windows") or []))
+
 
+async def run_async(cmd: list[str]) -> subprocess.CompletedProcess:
+    proc = await asyncio.create_subprocess_exec(
+        *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    )
+    out, err = await proc.communicate()
+    cp = subprocess.CompletedProcess(
+        cmd, proc.returncode,
+        out.decode("utf-8", errors="replace"),
+        err.decode("utf-8", errors="replace"),
+    )
+    cp.check_returncode()
+    return cp
 
-def run(cmd: list[str]) -> subprocess.CompletedProcess:
-    return subprocess.run(cmd, check=True, text=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+_detected_services: dict[tuple[str | None, int], str] = {}
 
 def detect_kwin_service(preferred: str | None = None) -> str:
     if preferred and preferred != "auto":
         return preferred
 
+    cache_key = (preferred, os.getuid())
+    cached = _detected_services.get(cache_key)
+    if cached:
+        return cached
+    service = probe_kwin_service()
+    _detected_services[cache_key] = service
+    return service
+
+def probe_kwin_service() -> str:
     # Auto: use the active service.
     candidates = [
         "plasma-kwin_wayland.service",
@@ -181,40 +248,42 @@ def detect_kwin_service(preferred: str | None = None) -> str:
     if not systemctl:
         return "plasma-kwin_wayland.service"
 
-    for svc in candidates:
-        try:
-            cp = subprocess.run(
-                [systemctl, "--user", "is-active", svc],
-                text=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE
-            )
-            if cp.returncode == 0 and cp.stdout.strip() == "active":
+    # One call for all units; it exits non-zero unless every unit is active.
+    try:
+        cp = subprocess.run(
+            [systemctl, "--user", "is-active", *candidates],
+            text=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        for svc, status in zip(candidates, cp.stdout.splitlines()):
+            if status.strip() == "active":
                 return svc
-        except Exception:
-            pass
+    except Exception:
+        pass
 
     # fallback
     return "plasma-kwin_wayland.service"
 
-def kwin_load_start_unload(js_path: str, script_id: str) -> None:
+async def kwin_load_start_unload(js_path: str, script_id: str) -> None:
+    # The three calls depend on each other, so they are awaited in order.
     qdbus = which_any("qdbus", "qdbus6")
     if qdbus:
-        run([qdbus, "org.kde.KWin", "/Scripting", "org.kde.kwin.Scripting.loadScript", js_path, script_id])
-        run([qdbus, "org.kde.KWin", "/Scripting", "org.kde.kwin.Scripting.start"])
-        run([qdbus, "org.kde.KWin", "/Scripting", "org.kde.kwin.Scripting.unloadScript", script_id])
+        await run_async([qdbus, "org.kde.KWin", "/Scripting", "org.kde.kwin.Scripting.loadScript", js_path, script_id])
+        await run_async([qdbus, "org.kde.KWin", "/Scripting", "org.kde.kwin.Scripting.start"])
+        await run_async([qdbus, "org.kde.KWin", "/Scripting", "org.kde.kwin.Scripting.unloadScript", script_id])
         return
 
     gdbus = which_any("gdbus")
     if gdbus:
-        run([gdbus, "call", "--session",
+        await run_async([gdbus, "call", "--session",
              "--dest", "org.kde.KWin",
              "--object-path", "/Scripting",
              "--method", "org.kde.kwin.Scripting.loadScript",
              js_path, script_id])
-        run([gdbus, "call", "--session",
+        await run_async([gdbus, "call", "--session",
              "--dest", "org.kde.KWin",
              "--object-path", "/Scripting",
              "--method", "org.kde.kwin.Scripting.start"])
-        run([gdbus, "call", "--session",
+        await run_async([gdbus, "call", "--session",
              "--dest", "org.kde.KWin",
              "--object-path", "/Scripting",
              "--method", "org.kde.kwin.Scripting.unloadScript",
@@ -223,11 +292,11 @@ def kwin_load_start_unload(js_path: str, script_id: str) -> None:
 
     raise RuntimeError("Missing qdbus/qdbus6 or gdbus.")
 
-def invoke_kwin_shortcut(shortcut_name: str) -> bool:
+async def invoke_kwin_shortcut(shortcut_name: str) -> bool:
     qdbus = which_any("qdbus", "qdbus6")
     if qdbus:
         try:
-            run([
+            await run_async([
                 qdbus,
                 "org.kde.kglobalaccel",
                 "/component/kwin",
@@ -241,7 +310,7 @@ def invoke_kwin_shortcut(shortcut_name: str) -> bool:
     gdbus = which_any("gdbus")
     if gdbus:
         try:
-            run([
+            await run_async([
                 gdbus, "call", "--session",
                 "--dest", "org.kde.kglobalaccel",
                 "--object-path", "/component/kwin",
@@ -254,25 +323,94 @@ def invoke_kwin_shortcut(shortcut_name: str) -> bool:
 
     return False
 
-def read_kwin_log_since(service: str, since_iso: str) -> list[str]:
-    cp = run([
+# Monitor ids are 1-based while KWin numbers screens from 0, so try both.
+@functools.lru_cache(maxsize=16)
+def screen_shortcut_names(n: int) -> tuple[str, ...]:
+    if n >= 1:
+        return (f"Window to Screen {n - 1}", f"Window to Screen {n}")
+    return (f"Window to Screen {n}",)
+
+async def try_screen_shortcut(n: int) -> str | None:
+    for shortcut_name in screen_shortcut_names(n):
+        if await invoke_kwin_shortcut(shortcut_name):
+            return shortcut_name
+    return None
+
+# journald splits lines longer than LineMax (48K bytes by default). State
+# lines are cut at this many characters, which stays below that even when
+# every character takes three bytes in UTF-8.
+STATE_LINE_CHARS = 12000
+# Stream reader limit; a single oversized window still fits on its line.
+JOURNAL_LINE_LIMIT = 4 * 1024 * 1024
+# Let journald drop everything that is not a JSON line printed by the script,
+# and bound the read to the tail; one sample is far below this many lines.
+JOURNAL_GREP = r"^(\{.*\}|js: \{.*\})$"
+JOURNAL_MAX_LINES = "4000"
+
+_journal_grep_supported: bool | None = None
+
+async def journal_grep_supported() -> bool:
+    # -g needs journalctl built with PCRE2; without it the lines are only
+    # filtered on this side.
+    global _journal_grep_supported
+    if _journal_grep_supported is None:
+        try:
+            proc = await run_async(["journalctl", "--version"])
+            _journal_grep_supported = "+PCRE2" in proc.stdout
+        except (OSError, subprocess.CalledProcessError):
+            _journal_grep_supported = False
+    return _journal_grep_supported
+
+async def read_kwin_log_since(service: str, since_iso: str) -> list[str]:
+    grep = await journal_grep_supported()
+    cmd = [
         "journalctl", "--user", "-u", service,
         "--since", since_iso,
+        *(("-g", JOURNAL_GREP) if grep else ()),
+        "-n", JOURNAL_MAX_LINES,
         "-o", "cat",
         "--no-pager"
-    ])
-    lines = []
-    for line in cp.stdout.splitlines():
-        # KWin JS print() usually has the "js: " prefix.
-        if line.startswith("js: "):
-            lines.append(line[4:])
-        else:
-            lines.append(line)
+    ]
+    proc = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        limit=JOURNAL_LINE_LIMIT,
+    )
+    stderr_task = asyncio.create_task(proc.stderr.read())
+    try:
+        lines = []
+        saw_output = False
+        # Stream the output and keep only the JSON lines printed by the script.
+        async for raw in proc.stdout:
+            saw_output = True
+            line = raw.decode("utf-8", errors="replace").rstrip("\r\n")
+            # KWin JS print() usually has the "js: " prefix.
+            if line.startswith("js: "):
+                line = line[4:]
+            if line.lstrip().startswith("{"):
+                lines.append(line)
+        err = await stderr_task
+        returncode = await proc.wait()
+    finally:
+        stderr_task.cancel()
+        if proc.returncode is None:
+            proc.kill()
+            # Reap the child even when this read is being cancelled.
+            await asyncio.shield(proc.wait())
+        await asyncio.gather(stderr_task, return_exceptions=True)
+    # journalctl -g exits 1 when nothing matched yet.
+    if grep and returncode == 1 and not saw_output:
+        return lines
+    if returncode:
+        raise subprocess.CalledProcessError(
+            returncode, cmd, "", err.decode("utf-8", errors="replace")
+        )
     return lines
 
-def safe_read_kwin_log_since(service: str, since_iso: str) -> list[str]:
+async def safe_read_kwin_log_since(service: str, since_iso: str) -> list[str]:
     try:
-        return read_kwin_log_since(service, since_iso)
+        return await read_kwin_log_since(service, since_iso)
     except subprocess.CalledProcessError as exc:
         msg = exc.stderr.strip() or exc.stdout.strip()
         raise RuntimeError(
@@ -280,11 +418,14 @@ def safe_read_kwin_log_since(service: str, since_iso: str) -> list[str]:
             + (f" Details: {msg}" if msg else "")
         ) from exc
 
-def build_js(target_pid: int | None) -> str:
+def build_js(target_pid: int | None, target_winid: str | None = None) -> str:
     pid_val = -1 if target_pid is None else target_pid
+    winid_val = "" if target_winid is None else target_winid
     return f"""
 (function () {{
   const targetPid = {pid_val};
+  const targetWinId = {json.dumps(winid_val)};
+  const lineBudget = {STATE_LINE_CHARS};
   const wins = workspace.stackingOrder;
   const resourceClassBlocklist = new Set([
     "org.kde.plasmashell"
@@ -293,6 +434,13 @@ def build_js(target_pid: int | None) -> str:
   const desktops = workspace.desktops || [];
   const currentDesktop = workspace.currentDesktop || null;
 
+  const braceRe = /[{{}}]/g;
+  function normId(v) {{
+    if (v === undefined || v === null) return "";
+    return String(v).toLowerCase().replace(braceRe, "");
+  }}
+  const targetNorm = targetWinId ? normId(targetWinId) : "";
+
   function rectToObj(r) {{
     if (!r) return null;
     return {{ x: r.x, y: r.y, width: r.width, height: r.height }};
@@ -355,9 +503,11 @@ def build_js(target_pid: int | None) -> str:
     desktops: desktopList,
     activeDesktopName: currentDesktop && currentDesktop.name ? currentDesktop.name : null
   }};
-  print(JSON.stringify(meta));
+  const windows = [];
 
   const aw = workspace.activeClient;
+  const activeInternalNorm = aw ? normId(aw.internalId) : "";
+  const activeWindowNorm = aw ? normId(aw.windowId) : "";
   for (let i = 0; i < wins.length; i++) {{
     const w = wins[i];
     if (!w) continue;
@@ -369,6 +519,7 @@ def build_js(target_pid: int | None) -> str:
     if (w.resourceClass && resourceClassBlocklist.has(w.resourceClass)) continue;
 
     if (targetPid !== -1 && w.pid !== targetPid) continue;
+    if (targetNorm && normId(w.internalId) !== targetNorm && normId(w.windowId) !== targetNorm) continue;
 
     const winId = (w.internalId !== undefined && w.internalId !== null)
       ? String(w.internalId)
@@ -383,9 +534,9 @@ def build_js(target_pid: int | None) -> str:
       || (w.maximizedHoriz === true)
       || (w.maximizedVert === true);
 
-    const activeMatch = aw
-      ? (normId(aw.internalId) === normId(internalId) || normId(aw.windowId) === normId(windowId))
-      : false;
+    // Missing ids normalize to "", which must not count as a match.
+    const activeMatch = (activeInternalNorm !== "" && activeInternalNorm === normId(w.internalId))
+      || (activeWindowNorm !== "" && activeWindowNorm === normId(w.windowId));
     const out = {{
       pid: w.pid,
       caption: w.caption || null,
@@ -410,7 +561,30 @@ def build_js(target_pid: int | None) -> str:
       active: (w.active === true) || activeMatch
     }};
 
-    print(JSON.stringify(out));
+    windows.push(JSON.stringify(out));
+  }}
+
+  // A few lines per sample instead of one per window, each kept small enough
+  // that journald does not split it.
+  const seq = Date.now();
+  const metaJson = JSON.stringify(meta);
+  const parts = [];
+  let chunk = [];
+  let chunkLen = metaJson.length;
+  for (let i = 0; i < windows.length; i++) {{
+    const s = windows[i];
+    if (chunk.length && chunkLen + s.length > lineBudget) {{
+      parts.push(chunk);
+      chunk = [];
+      chunkLen = 0;
+    }}
+    chunk.push(s);
+    chunkLen += s.length + 1;
+  }}
+  parts.push(chunk);
+  for (let i = 0; i < parts.length; i++) {{
+    print('{{"__type":"state","seq":' + seq + ',"part":' + i + ',"parts":' + parts.length
+      + (i === 0 ? ',"meta":' + metaJson : "") + ',"windows":[' + parts[i].join(",") + "]}}");
   }}
 }})();
 """.strip()
@@ -436,10 +610,12 @@ def build_js_action(
   const targetMonitor = {json.dumps(monitor_val)};
   const wins = workspace.stackingOrder;
 
+  const braceRe = /[{{}}]/g;
   function normId(v) {{
     if (v === undefined || v === null) return "";
-    return String(v).toLowerCase().replace(/[{{}}]/g, "");
+    return String(v).toLowerCase().replace(braceRe, "");
   }}
+  const targetNorm = targetWinId ? normId(targetWinId) : "";
 
   if (action === "print-active") {{
     const aw = workspace.activeClient;
@@ -477,11 +653,12 @@ def build_js_action(
 
     if (targetPid !== -1 && w.pid !== targetPid) continue;
 
-    const internalId = (w.internalId !== undefined && w.internalId !== null) ? String(w.internalId) : null;
-    const windowId = (w.windowId !== undefined && w.windowId !== null) ? String(w.windowId) : null;
-    const matchId = targetWinId
-      ? (normId(internalId) === normId(targetWinId) || normId(windowId) === normId(targetWinId))
-      : true;
+    let matchId = true;
+    if (targetWinId) {{
+      const internalNorm = normId(w.internalId);
+      const windowNorm = normId(w.windowId);
+      matchId = internalNorm === targetNorm || windowNorm === targetNorm;
+    }}
 
     if (!matchId) continue;
 
@@ -605,34 +782,80 @@ def build_js_action(
         }}
       }}
     }}
+
+    // A window id targets a single window; only broadcasts need the full scan.
+    if (targetWinId) break;
   }}
 }})();
 """.strip()
 
+_JSON_LINE_RE = re.compile(r"^[ \t]*(\{.*\})[ \t\r]*$", re.MULTILINE)
+
 def parse_json_lines(lines: list[str]) -> tuple[dict, list[dict]]:
     meta = {}
     windows = []
-    for ln in lines:
-        s = ln.strip()
-        if not (s.startswith("{") and s.endswith("}")):
-            continue
+    for s in _JSON_LINE_RE.findall("\n".join(lines)):
         try:
-            obj = json.loads(s)
+            obj = json_loads(s)
         except json.JSONDecodeError:
             continue
-        if obj.get("__type") == "meta":
+        kind = obj.get("__type")
+        if kind == "meta":
             meta = obj
-        else:
+        elif kind != "state":
             windows.append(obj)
     return meta, windows
 
+# build_js prints each part with this exact prefix.
+_STATE_HEAD_RE = re.compile(r'[ \t]*\{"__type":"state","seq":(\d+),"part":(\d+),"parts":(\d+)')
+
+def newest_state_parts(lines: list[str]) -> tuple[str, list[str]] | None:
+    # The newest sample wins if several were logged within the --since second,
+    # but only once all of its parts are in the journal.
+    parts_by_seq: dict[str, dict[int, str]] = {}
+    for ln in reversed(lines):
+        m = _STATE_HEAD_RE.match(ln)
+        if not m or not ln.rstrip().endswith("]}"):
+            continue
+        seq, part, count = m.group(1), int(m.group(2)), int(m.group(3))
+        parts = parts_by_seq.setdefault(seq, {})
+        parts.setdefault(part, ln)
+        if all(i in parts for i in range(count)):
+            return seq, [parts[i] for i in range(count)]
+    return None
+
+def state_lines_ready(lines: list[str]) -> bool:
+    # Ready once the latest logged sample is complete. Older script output has
+    # one line per window and no parts to wait for.
+    latest = next((m.group(1) for m in map(_STATE_HEAD_RE.match, reversed(lines)) if m), None)
+    if latest is None:
+        return True
+    found = newest_state_parts(lines)
+    return found is not None and found[0] == latest
+
+def parse_state_lines(lines: list[str]) -> tuple[dict, list[dict]]:
+    found = newest_state_parts(lines)
+    if found is not None:
+        try:
+            decoded = [json_loads(part) for part in found[1]]
+        except json.JSONDecodeError:
+            decoded = None
+        if decoded:
+            windows = [w for part in decoded for w in part.get("windows") or []]
+            return decoded[0].get("meta") or {}, windows
+    # Older script output: one meta line plus one line per window.
+    return parse_json_lines(lines)
+
+_EXEC_PLACEHOLDERS = frozenset(("%f", "%F", "%u", "%U", "%d", "%D", "%n", "%N", "%i", "%c", "%k", "%v", "%m"))
+
+# Many windows share a desktop file, so the same Exec lines repeat.
+@functools.lru_cache(maxsize=512)
 def sanitize_exec_command(value: str | None) -> str | None:
     if not value:
         return None
-    placeholders = ("%f", "%F", "%u", "%U", "%d", "%D", "%n", "%N", "%i", "%c", "%k", "%v", "%m")
     parts = value.split()
-    kept = [part for part in parts if not (part in placeholders or part.startswith("%"))]
-    return " ".join(kept).strip() or None
+    kept = " ".join(part for part in parts if not (part in _EXEC_PLACEHOLDERS or part.startswith("%")))
+    return kept.strip() or None
 
 def launch_exec_command(exec_cmd: str | None) -> bool:
     if not exec_cmd:
@@ -646,7 +869,7 @@ def launch_exec_command(exec_cmd: str | None) -> bool:
     except Exception:
         return False
 
-def send_keypress(key: str | None) -> bool:
+async def send_keypress(key: str | None) -> bool:
     if not key:
         return False
     tool = which_any("wtype", "xdotool")
@@ -666,66 +889,73 @@ def send_keypress(key: str | None) -> bool:
                 cmd += ["-k", base]
                 for mod in reversed(modifiers):
                     cmd += ["-m", mod]
-                run(cmd)
+                await run_async(cmd)
                 return True
             if len(key) == 1:
-                run([tool, key])
+                await run_async([tool, key])
                 return True
-            run([tool, "-k", key])
+            await run_async([tool, "-k", key])
             return True
         if tool.endswith("xdotool"):
-            run([tool, "key", "--clearmodifiers", key])
+            await run_async([tool, "key", "--clearmodifiers", key])
             return True
     except subprocess.CalledProcessError:
         return False
     return False
 
+_DESKTOP_SECTION_RE = re.compile(r"^[ \t]*\[([^\]\n]*)\][ \t]*$", re.MULTILINE)
+
+@functools.lru_cache(maxsize=8)
+def _desktop_keys_re(lang: str, lang_short: str) -> re.Pattern:
+    keys = ["Name", "X-GNOME-FullName", "Exec"]
+    if lang:
+        keys.append(f"Name[{lang}]")
+    if lang_short:
+        keys.append(f"Name[{lang_short}]")
+    return re.compile(
+        r"^[ \t]*(" + "|".join(re.escape(k) for k in keys) + r")[ \t]*=[ \t]*(.*?)[ \t]*$",
+        re.MULTILINE,
+    )
+
+def desktop_entry_section(text: str) -> str:
+    for m in _DESKTOP_SECTION_RE.finditer(text):
+        if m.group(1) != "Desktop Entry":
+            continue
+        nxt = _DESKTOP_SECTION_RE.search(text, m.end())
+        return text[m.end():nxt.start() if nxt else len(text)]
+    return ""
+
 def iter_desktop_entry_info(path: str) -> tuple[str | None, str | None]:
     lang = os.environ.get("LANG", "")
     lang = lang.split(".", 1)[0]
     lang_short = lang.split("_", 1)[0] if "_" in lang else ""
-    in_section = False
     name = None
     localized = None
     exec_cmd = None
     try:
         with open(path, "r", encoding="utf-8", errors="replace") as f:
-            for raw in f:
-                line = raw.strip()
-                if not line or line.startswith("#"):
-                    continue
-                if line.startswith("[") and line.endswith("]"):
-                    in_section = (line == "[Desktop Entry]")
-                    continue
-                if not in_section or "=" not in line:
-                    continue
-                key, val = line.split("=", 1)
-                key = key.strip()
-                val = val.strip()
-                if key == "Name":
-                    name = val
-                elif lang and key == f"Name[{lang}]":
-                    localized = val
-                elif lang_short and key == f"Name[{lang_short}]":
-                    localized = val
-                elif key == "X-GNOME-FullName" and not name:
-                    name = val
-                elif key == "Exec":
-                    exec_cmd = sanitize_exec_command(val)
+            text = f.read()
     except OSError:
         return None, None
+    has_exec = False
+    for m in _desktop_keys_re(lang, lang_short).finditer(desktop_entry_section(text)):
+        key, val = m.group(1), m.group(2)
+        if key == "Name":
+            name = val
+        elif key == "X-GNOME-FullName":
+            if not name:
+                name = val
+            continue
+        elif key == "Exec":
+            exec_cmd = sanitize_exec_command(val)
+            has_exec = True
+        else:
+            localized = val
+        if has_exec and name is not None and (localized is not None or not lang):
+            break
     return localized or name, exec_cmd
 
-def find_desktop_file(desktop_file_name: str) -> str | None:
-    if not desktop_file_name:
-        return None
-    if os.path.isabs(desktop_file_name) and os.path.exists(desktop_file_name):
-        return desktop_file_name
-
-    names = [desktop_file_name]
-    if not desktop_file_name.endswith(".desktop"):
-        names.append(desktop_file_name + ".desktop")
-
+def desktop_data_dirs() -> tuple[str, ...]:
     data_dirs = []
     data_dirs.append(os.path.expanduser("~/.local/share"))
     xdg_dirs = os.environ.get("XDG_DATA_DIRS", "")
@@ -738,37 +968,81 @@ def find_desktop_file(desktop_file_name: str) -> str | None:
         "/usr/share/flatpak/exports/share",
         "/var/lib/snapd/desktop",
     ])
+    return tuple(data_dirs)
 
+def desktop_app_dirs_state(data_dirs: tuple[str, ...]) -> tuple[tuple[str, int | None], ...]:
+    # Adding or removing a .desktop file bumps its directory's mtime.
+    state = []
     for base in data_dirs:
         app_dir = os.path.join(base, "applications")
-        for name in names:
-            path = os.path.join(app_dir, name)
-            if os.path.exists(path):
-                return path
-    return None
+        try:
+            mtime = os.stat(app_dir).st_mtime_ns
+        except OSError:
+            mtime = None
+        state.append((app_dir, mtime))
+    return tuple(state)
+
+# Keyed by each applications dir and its mtime, so the listing is rebuilt
+# only when an app is installed or removed or the environment changes.
+@functools.lru_cache(maxsize=1)
+def _desktop_index(app_dirs: tuple[tuple[str, int | None], ...]) -> dict[str, str]:
+    index: dict[str, str] = {}
+    for app_dir, mtime in app_dirs:
+        if mtime is None:
+            continue
+        try:
+            with os.scandir(app_dir) as it:
+                for entry in it:
+                    # Earlier data dirs take precedence.
+                    index.setdefault(entry.name.lower(), entry.path)
+        except OSError:
+            continue
+    return index
+
+def find_desktop_files(names: Iterable[str]) -> dict[str, str]:
+    index = _desktop_index(desktop_app_dirs_state(desktop_data_dirs()))
+    found: dict[str, str] = {}
+    for desktop_file_name in names:
+        if not desktop_file_name or desktop_file_name in found:
+            continue
+        # One stat, and directories are not mistaken for desktop files.
+        if os.path.isabs(desktop_file_name) and os.path.isfile(desktop_file_name):
+            found[desktop_file_name] = desktop_file_name
+            continue
+        name = desktop_file_name.lower()
+        path = index.get(name)
+        if path is None and not name.endswith(".desktop"):
+            path = index.get(name + ".desktop")
+        if path:
+            found[desktop_file_name] = path
+    return found
+
+def window_app_candidates(w: dict) -> list[str]:
+    candidates = []
+    for key in ("desktopFileName", "resourceClass", "resourceName"):
+        val = w.get(key)
+        if not val:
+            continue
+        val = str(val)
+        candidates.append(val)
+        lower = val.lower()
+        if lower != val:
+            candidates.append(lower)
+    return candidates
 
 def enrich_app_names(windows: list[dict]) -> None:
-    cache: dict[str, tuple[str | None, str | None]] = {}
-    for w in windows:
-        candidates = []
-        for key in ("desktopFileName", "resourceClass", "resourceName"):
-            val = w.get(key)
-            if not val:
-                continue
-            candidates.append(val)
-            lower = str(val).lower()
-            if lower != val:
-                candidates.append(lower)
+    per_window = [window_app_candidates(w) for w in windows]
+    paths = find_desktop_files(c for candidates in per_window for c in candidates)
 
+    # Each desktop file is read once, however many windows share it.
+    infos = {p: iter_desktop_entry_info(p) for p in dict.fromkeys(paths.values())}
+
+    for w, candidates in zip(windows, per_window):
         app_name = None
         app_exec = None
         for candidate in candidates:
-            if candidate in cache:
-                app_name, app_exec = cache[candidate]
-            else:
-                path = find_desktop_file(str(candidate))
-                app_name, app_exec = iter_desktop_entry_info(path) if path else (None, None)
-                cache[candidate] = (app_name, app_exec)
+            path = paths.get(candidate)
+            app_name, app_exec = infos[path] if path else (None, None)
             if app_name or app_exec:
                 break
 
@@ -796,44 +1070,130 @@ def resolve_services(preferred: str | None) -> list[str]:
     candidates = get_service_candidates(preferred)
     return order_candidates(preferred, candidates)
 
-def collect_kwin_lines(services: list[str], since_iso: str) -> tuple[str, list[str]]:
+# The journal is flushed before the first read, so retries are only for
+# late stragglers: back off quickly instead of sleeping a fixed 150 ms.
+JOURNAL_RETRY_DELAYS = (0.02, 0.04, 0.08, 0.16)
+
+_journal_sync_supported = True
+
+async def sync_journal() -> None:
+    # Best effort; unprivileged users may not be allowed to request a sync.
+    global _journal_sync_supported
+    if not _journal_sync_supported:
+        return
+    try:
+        await run_async(["journalctl", "--sync"])
+    except (OSError, subprocess.CalledProcessError):
+        _journal_sync_supported = False
+
+async def poll_kwin_log_since(service: str, since_iso: str) -> tuple[str, list[str]]:
     last_err = None
-    for idx, service in enumerate(services):
-        for _ in range(3):
+    partial: list[str] = []
+    for delay in (0.0, *JOURNAL_RETRY_DELAYS):
+        if delay:
+            await asyncio.sleep(delay)
+        try:
+            lines = await safe_read_kwin_log_since(service, since_iso)
+        except RuntimeError as exc:
+            last_err = exc
+            continue
+        # A sample split over several lines may be only partly flushed yet.
+        if lines and state_lines_ready(lines):
+            return service, lines
+        if lines:
+            partial = lines
+    if partial:
+        return service, partial
+    if last_err:
+        raise last_err
+    return service, []
+
+async def collect_kwin_lines(services: list[str], since_iso: str) -> tuple[str, list[str]]:
+    # The detected unit comes first and normally has the output; only probe
+    # the other candidates, concurrently, when it has none.
+    last_err = None
+    try:
+        service, lines = await poll_kwin_log_since(services[0], since_iso)
+        if lines:
+            return service, lines
+    except RuntimeError as exc:
+        last_err = exc
+    tasks = [asyncio.create_task(poll_kwin_log_since(s, since_iso)) for s in services[1:]]
+    try:
+        for fut in asyncio.as_completed(tasks):
             try:
-                lines = safe_read_kwin_log_since(service, since_iso)
-                if lines:
-                    return service, lines
+                service, lines = await fut
             except RuntimeError as exc:
                 last_err = exc
-            time.sleep(0.15)
-        if idx == len(services) - 1:
-            break
+                continue
+            if lines:
+                return service, lines
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
     if last_err:
         raise last_err
     return services[0], []
 
-def collect_windows(pid: int | None, services: list[str], since_iso: str) -> tuple[str, dict, list[dict]]:
+# KWin script cycles must not interleave: concurrent samples would share a
+# script id and read each other's journal output.
+_kwin_script_lock = asyncio.Lock()
+
+def script_tmp_dir() -> str | None:
+    # Prefer tmpfs so script files never touch the disk.
+    for d in (os.environ.get("XDG_RUNTIME_DIR"), "/dev/shm"):
+        if d and os.path.isdir(d):
+            return d
+    return None
+
+def remove_file(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+# Actions run once per user gesture, so one script file is reused (rewritten
+# under the script lock) and removed when the process exits.
+_action_js_path: str | None = None
+
+def write_action_script(js_code: str) -> str:
+    global _action_js_path
+    if _action_js_path is None:
+        with tempfile.NamedTemporaryFile("w", suffix=".js", dir=script_tmp_dir(), delete=False) as f:
+            f.write(js_code)
+        _action_js_path = f.name
+        atexit.register(remove_file, _action_js_path)
+        return _action_js_path
+    with open(_action_js_path, "w") as f:
+        f.write(js_code)
+    return _action_js_path
+
+async def collect_windows(
+    pid: int | None,
+    services: list[str],
+    since_iso: str,
+    winid: str | None = None,
+) -> tuple[str, dict, list[dict]]:
     script_id = f"winstate_sample_{os.getpid()}"
-    js_code = build_js(pid)
+    js_code = build_js(pid, winid)
 
-    with tempfile.NamedTemporaryFile("w", suffix=".js", delete=False) as f:
+    with tempfile.NamedTemporaryFile("w", suffix=".js", dir=script_tmp_dir(), delete=False) as f:
         js_path = f.name
         f.write(js_code)
 
     try:
-        kwin_load_start_unload(js_path, script_id)
-        service, lines = collect_kwin_lines(services, since_iso)
-        meta, windows = parse_json_lines(lines)
-        enrich_app_names(windows)
+        async with _kwin_script_lock:
+            await kwin_load_start_unload(js_path, script_id)
+            await sync_journal()
+            service, lines = await collect_kwin_lines(services, since_iso)
+        meta, windows = parse_state_lines(lines)
+        await asyncio.to_thread(enrich_app_names, windows)
         return service, meta, windows
     finally:
-        try:
-            os.remove(js_path)
-        except OSError:
-            pass
+        remove_file(js_path)
 
-def run_action(
+async def run_action(
     pid: int | None,
     winid: str | None,
     action: str | None,
@@ -842,16 +1202,9 @@ def run_action(
 ) -> None:
     script_id = f"winstate_action_{os.getpid()}"
     js_code = build_js_action(pid, winid, action, target_desktop, target_monitor)
-    with tempfile.NamedTemporaryFile("w", suffix=".js", delete=False) as f:
-        js_path = f.name
-        f.write(js_code)
-    try:
-        kwin_load_start_unload(js_path, script_id)
-    finally:
-        try:
-            os.remove(js_path)
-        except OSError:
-            pass
+    async with _kwin_script_lock:
+        js_path = write_action_script(js_code)
+        await kwin_load_start_unload(js_path, script_id)
 
 def format_monitor_name(output_obj: dict) -> str | None:
     name = output_obj.get("name")
@@ -860,44 +1213,43 @@ def format_monitor_name(output_obj: dict) -> str | None:
         return f"{model} [{name}]"
     return model or name
 
+# Payload key -> key in the sampled window object.
+_WINDOW_FIELDS = (
+    ("id", "windowId"),
+    ("title", "appName"),
+    ("pid", "pid"),
+    ("caption", "caption"),
+    ("on_all_desktops", "onAllDesktops"),
+    ("minimized", "minimized"),
+    ("maximized", "maximized"),
+    ("fullScreen", "fullScreen"),
+    ("appExec", "appExec"),
+    ("active", "active"),
+)
+_WIN_KEYS_OUT = tuple(out for out, _ in _WINDOW_FIELDS)
+_WIN_KEYS_IN = tuple(src for _, src in _WINDOW_FIELDS)
+
+def window_view(w: dict) -> dict:
+    return dict(zip(_WIN_KEYS_OUT, map(w.get, _WIN_KEYS_IN)))
+
 def build_desktop_windows(desktop_names: list[str], windows: list[dict], active_name: str | None) -> list[dict]:
+    # Sort once up front; the per-desktop filter keeps that order. The sort is
+    # stable, so the first window per windowId is still the one kept.
+    ordered = sorted(windows, key=lambda w: (w.get("pid") is None, w.get("pid") or 0, w.get("windowId") or ""))
+    # Reshape each window once; pinned windows are listed on every desktop.
+    views = [(w, window_view(w)) for w in ordered]
     results = []
     for dname in desktop_names:
-        wins = []
-        for w in windows:
-            if w.get("onAllDesktops"):
-                wins.append(w)
-                continue
-            if dname in (w.get("desktops") or []):
-                wins.append(w)
-        seen_ids = set()
-        unique = []
-        for w in wins:
-            win_id = w.get("windowId")
-            if not win_id or win_id in seen_ids:
-                continue
-            seen_ids.add(win_id)
-            unique.append(w)
-        wins = unique
-        wins.sort(key=lambda w: (w.get("pid") is None, w.get("pid") or 0, w.get("windowId") or ""))
+        by_id = {}
+        for w, view in views:
+            if w.get("onAllDesktops") or dname in (w.get("desktops") or []):
+                win_id = w.get("windowId")
+                if win_id and win_id not in by_id:
+                    by_id[win_id] = view
         results.append({
             "desktop_name": dname,
             "desktop_is_active": (active_name == dname) if active_name else False,
-            "windows": [
-                {
-                    "id": w.get("windowId"),
-                    "title": w.get("appName"),
-                    "pid": w.get("pid"),
-                    "caption": w.get("caption"),
-                    "on_all_desktops": w.get("onAllDesktops"),
-                    "minimized": w.get("minimized"),
-                    "maximized": w.get("maximized"),
-                    "fullScreen": w.get("fullScreen"),
-                    "appExec": w.get("appExec"),
-                    "active": w.get("active"),
-                }
-                for w in wins
-            ],
+            "windows": list(by_id.values()),
         })
     return results
 
@@ -907,62 +1259,76 @@ def collect_desktop_names(meta: dict, windows: list[dict]) -> list[str]:
     if names:
         return names
 
-    seen = set()
+    return list(dict.fromkeys(
+        name for w in windows for name in w.get("desktops") or () if name != "ALL"
+    ))
+
+def group_windows_by_output(windows: list[dict]) -> dict[str | None, list[dict]]:
+    wins_by_output: dict[str | None, list[dict]] = {}
     for w in windows:
-        for name in w.get("desktops") or []:
-            if name == "ALL":
-                continue
-            if name not in seen:
-                seen.add(name)
-                names.append(name)
-    return names
+        wins_by_output.setdefault((w.get("output") or {}).get("name"), []).append(w)
+    return wins_by_output
 
-def collect_outputs(meta: dict, windows: list[dict]) -> list[dict]:
+def collect_outputs(meta: dict, wins_by_output: dict[str | None, list[dict]]) -> list[dict]:
     outputs = meta.get("outputs") or []
     if outputs:
         return outputs
 
-    by_name = {}
-    for w in windows:
-        out = w.get("output") or {}
-        name = out.get("name")
-        if not name:
-            continue
-        if name not in by_name:
-            by_name[name] = out
-    return list(by_name.values())
+    # Fall back to the output of the first window seen on each named output.
+    return [wins[0]["output"] for name, wins in wins_by_output.items() if name]
 
-def sort_outputs_by_geometry(outputs: list[dict]) -> list[dict]:
-    def key_fn(out: dict) -> tuple[int, int]:
-        geom = out.get("geometry") or {}
-        x = geom.get("x")
-        y = geom.get("y")
-        return (y if isinstance(y, int) else 0, x if isinstance(x, int) else 0)
-    return sorted(outputs, key=key_fn)
+_NO_GEOMETRY: dict = {}
 
-def build_monitors(meta: dict, windows: list[dict]) -> list[dict]:
-    outputs = sort_outputs_by_geometry(collect_outputs(meta, windows))
+def output_sort_key(out: dict) -> tuple[int, int]:
+    geom = out.get("geometry") or _NO_GEOMETRY
+    x = geom.get("x")
+    y = geom.get("y")
+    return (y if isinstance(y, int) else 0, x if isinstance(x, int) else 0)
+
+def sort_outputs_by_geometry(outputs: list[dict]) -> list[dict]:
+    if len(outputs) < 2:
+        return list(outputs)
+    return sorted(outputs, key=output_sort_key)
+
+_MONITOR_STATIC_KEYS = (
+    "monitor_id",
+    "monitor_name",
+    "monitor_x",
+    "monitor_y",
+    "monitor_width",
+    "monitor_height",
+    "reserved_bottom",
+)
+
+def iter_monitor_rows(meta: dict, windows: list[dict]):
+    wins_by_output = group_windows_by_output(windows)
+    outputs = sort_outputs_by_geometry(collect_outputs(meta, wins_by_output))
     desktop_names = collect_desktop_names(meta, windows)
     active_name = meta.get("activeDesktopName")
-    monitors = []
 
     for idx, out in enumerate(outputs, start=1):
-        out_name = out.get("name")
         out_geom = out.get("geometry") or {}
-        wins = [w for w in windows if (w.get("output") or {}).get("name") == out_name]
-        monitors.append({
-            "monitor_id": idx,
-            "monitor_name": format_monitor_name(out),
-            "monitor_x": out_geom.get("x"),
-            "monitor_y": out_geom.get("y"),
-            "monitor_width": out_geom.get("width"),
-            "monitor_height": out_geom.get("height"),
-            "reserved_bottom": 48,
-            "on_all_desktops": all(w.get("onAllDesktops") for w in wins),
-            "desktops": build_desktop_windows(desktop_names, wins, active_name),
-        })
+        wins = wins_by_output.get(out.get("name"), [])
+        static = (
+            idx,
+            format_monitor_name(out),
+            out_geom.get("x"),
+            out_geom.get("y"),
+            out_geom.get("width"),
+            out_geom.get("height"),
+            48,
+        )
+        yield (
+            static,
+            all(w.get("onAllDesktops") for w in wins),
+            build_desktop_windows(desktop_names, wins, active_name),
+        )
 
-    return monitors
+def build_monitors(meta: dict, windows: list[dict]) -> list[dict]:
+    return [
+        {**dict(zip(_MONITOR_STATIC_KEYS, static)), "on_all_desktops": on_all, "desktops": desktops}
+        for static, on_all, desktops in iter_monitor_rows(meta, windows)
+    ]
 
 def build_payload(service: str, meta: dict, windows: list[dict]) -> dict:
     return {
@@ -971,17 +1337,135 @@ def build_payload(service: str, meta: dict, windows: list[dict]) -> dict:
         "monitors": build_monitors(meta, windows),
     }
 
-def get_state_snapshot(pid: int | None, services: list[str]) -> dict:
-    since = datetime.now(timezone.utc).isoformat(timespec="seconds")
-    service, meta, windows = collect_windows(pid, services, since)
+# Monitor geometry and the service name rarely change, so their JSON is kept
+# as ready-made prefixes and only the windows are serialized per tick.
+@functools.lru_cache(maxsize=32)
+def _monitor_prefix(static: tuple) -> str:
+    return json_dumps(dict(zip(_MONITOR_STATIC_KEYS, static)))[:-1] + ',"on_all_desktops":'
+
+@functools.lru_cache(maxsize=4)
+def _state_prefix(service: str) -> str:
+    return '{"type":"state","payload":{"service":' + json_dumps(service) + ',"timestamp":'
+
+def build_state_message(service: str, meta: dict, windows: list[dict]) -> str:
+    monitors = ",".join(
+        _monitor_prefix(static)
+        + ("true" if on_all else "false")
+        + ',"desktops":'
+        + json_dumps(desktops)
+        + "}"
+        for static, on_all, desktops in iter_monitor_rows(meta, windows)
+    )
+    return _state_prefix(service) + json_dumps(round(time.time(), 2)) + ',"monitors":[' + monitors + "]}}"
+
+_since_cache: tuple[int, str] = (0, "")
+
+def journal_since() -> str:
+    global _since_cache
+    now_s = int(time.time())
+    if now_s != _since_cache[0]:
+        _since_cache = (now_s, datetime.fromtimestamp(now_s, timezone.utc).isoformat(timespec="seconds"))
+    return _since_cache[1]
+
+async def collect_raw_state(pid: int | None, services: list[str]) -> tuple[str, dict, list[dict]]:
+    return await collect_windows(pid, services, journal_since())
+
+async def get_state_snapshot(pid: int | None, services: list[str]) -> dict:
+    service, meta, windows = await collect_raw_state(pid, services)
     return build_payload(service, meta, windows)
 
+# Unchanged samples are not re-sent, but a full state goes out at least this
+# often so clients can resync.
+STATE_RESYNC_TICKS = 30
+
+# WS command name -> (verb used in the ack, KWin actions run in order).
+WINDOW_ACTION_COMMANDS = {
+    "CloseEvent": ("close", ("close",)),
+    "MinimizeEvent": ("minimize", ("activate", "minimize")),
+    "MaximizeEvent": ("maximize", ("activate", "maximize")),
+    "RestoreEvent": ("restore", ("restore",)),
+    "FullscreenEvent": ("fullscreen", ("activate", "fullscreen")),
+    "FullscreenExitEvent": ("fullscreen-exit", ("activate", "fullscreen-exit")),
+    "PinToggleEvent": ("pin-toggle", ("pin-toggle",)),
+}
+
+class QueuedSender:
+    # Per-connection outbox drained by a single writer task, so handlers never
+    # wait on the socket and a state superseded before it was written is dropped.
+    MAX_BATCH = 16
+
+    def __init__(self, websocket):
+        self.websocket = websocket
+        self.queue: asyncio.Queue[str] = asyncio.Queue()
+        self.error: Exception | None = None
+
+    async def send(self, message: str) -> None:
+        if self.error:
+            raise self.error
+        self.queue.put_nowait(message)
+
+    async def run(self) -> None:
+        try:
+            while True:
+                batch = [await self.queue.get()]
+                while not self.queue.empty() and len(batch) < self.MAX_BATCH:
+                    batch.append(self.queue.get_nowait())
+                for message in drop_stale_states(batch):
+                    await self.websocket.send(message)
+        except Exception as exc:
+            self.error = exc
+
+def drop_stale_states(batch: list[str]) -> list[str]:
+    # Acks keep their order; only the newest state message is kept.
+    states = [i for i, m in enumerate(batch) if m.startswith('{"type":"state"')]
+    stale = set(states[:-1])
+    return [m for i, m in enumerate(batch) if i not in stale]
+
+async def watch_kwin_signals(on_signal: Callable[[], None]) -> None:
+    # KWin has no D-Bus signals for window changes, but desktop switches and
+    # edits are announced on /VirtualDesktopManager. Every line gdbus prints
+    # is a wake-up; the sender loops do the actual sampling.
+    gdbus = which_any("gdbus")
+    if not gdbus:
+        return
+    proc = await asyncio.create_subprocess_exec(
+        gdbus, "monitor", "--session",
+        "--dest", "org.kde.KWin",
+        "--object-path", "/VirtualDesktopManager",
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.DEVNULL,
+    )
+    try:
+        async for _ in proc.stdout:
+            on_signal()
+    finally:
+        if proc.returncode is None:
+            proc.kill()
+
+async def wait_for_state_change(changed: asyncio.Event, timeout: float) -> None:
+    try:
+        await asyncio.wait_for(changed.wait(), timeout)
+    except asyncio.TimeoutError:
+        pass
+    changed.clear()
+
+_ACK_PREFIX = '{"type":"ack","payload":'
+
 async def send_ack(websocket, payload: dict, debug: bool) -> None:
-    ack = {"type": "ack", "payload": payload}
-    await websocket.send(json.dumps(ack, ensure_ascii=False))
+    await websocket.send(_ACK_PREFIX + json_dumps(payload) + "}")
     if debug:
         print(f"ack sent: {payload.get('command')}", flush=True)
 
+def run_event_loop(coro):
+    try:
+        import uvloop
+    except ImportError:  # optional speedup
+        uvloop = None
+    if uvloop is None:
+        return asyncio.run(coro)
+    with asyncio.Runner(loop_factory=uvloop.new_event_loop) as runner:
+        return runner.run(coro)
+
 def main():
     ap = argparse.ArgumentParser(
         description="KWin: window monitor/desktop state in JSON format (per sample.json)."
@@ -1044,8 +1528,8 @@ def main():
 
     services = resolve_services(args.service)
 
-    def build_state() -> dict:
-        return get_state_snapshot(args.pid, services)
+    async def build_state() -> dict:
+        return await get_state_snapshot(args.pid, services)
 
     def log_debug(message: str) -> None:
         if args.debug:
@@ -1053,7 +1537,7 @@ def main():
 
     def parse_command_message(message: str) -> dict | None:
         try:
-            obj = json.loads(message)
+            obj = json_loads(message)
         except json.JSONDecodeError:
             return None
         payload = obj.get("payload") or {}
@@ -1073,168 +1557,169 @@ def main():
             "raw": obj,
         }
 
+    # One event per connected client; set whenever the KWin state may have
+    # changed so sender loops sample right away instead of waiting a tick.
+    state_waiters: set[asyncio.Event] = set()
+
+    def notify_state_changed(exclude: asyncio.Event | None = None) -> None:
+        for changed in state_waiters:
+            if changed is not exclude:
+                changed.set()
+
     async def push_state(websocket) -> None:
         try:
-            payload_now = build_state()
-            await websocket.send(json.dumps({"type": "state", "payload": payload_now}, ensure_ascii=False))
+            raw = await collect_raw_state(args.pid, services)
+            await websocket.send(build_state_message(*raw))
             log_debug("state pushed after command")
         except Exception as exc:
             print(f"state push error: {exc}", flush=True)
 
-    async def handle_command(cmd: dict, websocket) -> None:
+    async def handle_window_action(cmd: dict, websocket) -> bool:
         name = cmd.get("name")
         window_id = cmd.get("window_id")
-        desktop_index = cmd.get("desktop_index")
-        target_monitor = cmd.get("target_monitor")
-        target_desktop = cmd.get("target_desktop")
-        exec_cmd = cmd.get("exec_cmd")
-        key = cmd.get("key")
+        if not window_id:
+            return False
+        verb, actions = WINDOW_ACTION_COMMANDS[name]
+        for kwin_action in actions:
+            await run_action(None, window_id, kwin_action, None, None)
+        command = f"kwin {verb} {window_id}"
+        await send_ack(websocket, {"name": name, "windowId": window_id, "command": command}, args.debug)
+        await push_state(websocket)
+        return True
 
-        if name == "CloseEvent" and window_id:
-            command = f"kwin close {window_id}"
-            run_action(None, window_id, "close", None, None)
-            await send_ack(websocket, {"name": name, "windowId": window_id, "command": command}, args.debug)
-            await push_state(websocket)
-            return
-        if name == "MinimizeEvent" and window_id:
-            command = f"kwin minimize {window_id}"
-            run_action(None, window_id, "activate", None, None)
-            run_action(None, window_id, "minimize", None, None)
-            await send_ack(websocket, {"name": name, "windowId": window_id, "command": command}, args.debug)
-            await push_state(websocket)
-            return
-        if name == "MaximizeEvent" and window_id:
-            command = f"kwin maximize {window_id}"
-            run_action(None, window_id, "activate", None, None)
-            run_action(None, window_id, "maximize", None, None)
-            await send_ack(websocket, {"name": name, "windowId": window_id, "command": command}, args.debug)
-            await push_state(websocket)
-            return
-        if name == "RestoreEvent" and window_id:
-            command = f"kwin restore {window_id}"
-            run_action(None, window_id, "restore", None, None)
-            await send_ack(websocket, {"name": name, "windowId": window_id, "command": command}, args.debug)
-            await push_state(websocket)
-            return
-        if name == "FullscreenEvent" and window_id:
-            command = f"kwin fullscreen {window_id}"
-            run_action(None, window_id, "activate", None, None)
-            run_action(None, window_id, "fullscreen", None, None)
-            await send_ack(websocket, {"name": name, "windowId": window_id, "command": command}, args.debug)
-            await push_state(websocket)
-            return
-        if name == "FullscreenExitEvent" and window_id:
-            command = f"kwin fullscreen-exit {window_id}"
-            run_action(None, window_id, "activate", None, None)
-            run_action(None, window_id, "fullscreen-exit", None, None)
-            await send_ack(websocket, {"name": name, "windowId": window_id, "command": command}, args.debug)
-            await push_state(websocket)
-            return
-        if name == "PinToggleEvent" and window_id:
-            command = f"kwin pin-toggle {window_id}"
-            run_action(None, window_id, "pin-toggle", None, None)
-            await send_ack(websocket, {"name": name, "windowId": window_id, "command": command}, args.debug)
+    async def handle_launch_app(cmd: dict, websocket) -> bool:
+        name = cmd.get("name")
+        exec_cmd = cmd.get("exec_cmd")
+        if not exec_cmd:
+            return False
+        command = f"exec {exec_cmd}"
+        if launch_exec_command(exec_cmd):
+            await send_ack(websocket, {"name": name, "command": command}, args.debug)
             await push_state(websocket)
-            return
-        if name == "LaunchApp" and exec_cmd:
-            command = f"exec {exec_cmd}"
-            if launch_exec_command(exec_cmd):
-                await send_ack(websocket, {"name": name, "command": command}, args.debug)
-                await push_state(websocket)
-            return
-        if name == "KeyEvent" and key:
-            command = f"key {key}"
-            if window_id:
-                run_action(None, window_id, "activate", None, None)
-                time.sleep(0.1)
-            if send_keypress(key):
-                await send_ack(websocket, {"name": name, "windowId": window_id, "command": command}, args.debug)
-                await push_state(websocket)
-            else:
-                await send_ack(
-                    websocket,
-                    {"name": name, "windowId": window_id, "command": f"error: key {key} failed"},
-                    args.debug
-                )
-            return
-
-        if name == "ActivateWindow" and window_id:
-            command = f"kwin activate {window_id}"
-            run_action(None, window_id, "activate", None, None)
-            _, _, windows = collect_windows(
-                args.pid,
-                services,
-                datetime.now(timezone.utc).isoformat(timespec="seconds"),
-            )
-            switch_to_screen_for_window(windows, window_id)
-            invoke_kwin_shortcut("Activate Window Demanding Attention")
-            run_action(None, window_id, "clear-attention", None, None)
-            invoke_kwin_shortcut("Window Raise")
-            run_action(None, window_id, "activate", None, None)
+        return True
+
+    async def handle_key_event(cmd: dict, websocket) -> bool:
+        name = cmd.get("name")
+        window_id = cmd.get("window_id")
+        key = cmd.get("key")
+        if not key:
+            return False
+        command = f"key {key}"
+        if window_id:
+            await run_action(None, window_id, "activate", None, None)
+            await asyncio.sleep(0.1)
+        if await send_keypress(key):
             await send_ack(websocket, {"name": name, "windowId": window_id, "command": command}, args.debug)
             await push_state(websocket)
-            return
-
-        if name == "SwitchDesktop" and desktop_index:
-            command = f"kwin switch-desktop {desktop_index}"
-            run_action(None, None, "switch-desktop", str(desktop_index), None)
+        else:
             await send_ack(
                 websocket,
-                {"name": name, "command": command, "desktopIndex": desktop_index},
-                args.debug,
+                {"name": name, "windowId": window_id, "command": f"error: key {key} failed"},
+                args.debug
             )
-            await push_state(websocket)
-            return
-
-        if name == "MoveWindow" and window_id and target_desktop:
-            commands = []
-            payload_state = build_state()
-            should_pin = is_monitor_all_pinned(payload_state, target_monitor)
-            window_pinned = find_window_pinned(payload_state, window_id)
-            if target_monitor:
-                current_monitor = find_window_monitor(payload_state, window_id)
-                if current_monitor is None or int(current_monitor) != int(target_monitor):
-                    commands.append(f"kwin activate {window_id}")
-                    run_action(None, window_id, "activate", None, None)
-                    time.sleep(0.2)
-                    used_shortcut = False
-                    if str(target_monitor).isdigit():
-                        n = int(target_monitor)
-                        tried = []
-                        if n >= 1:
-                            tried.append(f"Window to Screen {n - 1}")
-                        tried.append(f"Window to Screen {n}")
-                        for shortcut_name in tried:
-                            if invoke_kwin_shortcut(shortcut_name):
-                                commands.append(f"kwin shortcut {shortcut_name}")
-                                used_shortcut = True
-                                break
-                    if not used_shortcut:
-                        commands.append(f"kwin move-monitor {window_id} {target_monitor}")
-                        run_action(None, window_id, "move-monitor", None, str(target_monitor))
-            commands.append(f"kwin move-desktop {window_id} {target_desktop}")
-            run_action(None, window_id, "move-desktop", str(target_desktop), None)
-            if should_pin and window_pinned is False:
-                commands.append(f"kwin pin-toggle {window_id}")
-                run_action(None, window_id, "pin-toggle", None, None)
-            commands.append(f"kwin activate {window_id}")
-            run_action(None, window_id, "activate", None, None)
-            payload_state = build_state()
-            if find_window_fullscreen(payload_state, window_id):
+        return True
+
+    async def handle_activate_window(cmd: dict, websocket) -> bool:
+        name = cmd.get("name")
+        window_id = cmd.get("window_id")
+        if not window_id:
+            return False
+        command = f"kwin activate {window_id}"
+        await run_action(None, window_id, "activate", None, None)
+        _, _, windows = await collect_windows(args.pid, services, journal_since())
+        await switch_to_screen_for_window(windows, window_id)
+        await invoke_kwin_shortcut("Activate Window Demanding Attention")
+        await run_action(None, window_id, "clear-attention", None, None)
+        await invoke_kwin_shortcut("Window Raise")
+        await run_action(None, window_id, "activate", None, None)
+        await send_ack(websocket, {"name": name, "windowId": window_id, "command": command}, args.debug)
+        await push_state(websocket)
+        return True
+
+    async def handle_switch_desktop(cmd: dict, websocket) -> bool:
+        name = cmd.get("name")
+        desktop_index = cmd.get("desktop_index")
+        if not desktop_index:
+            return False
+        command = f"kwin switch-desktop {desktop_index}"
+        await run_action(None, None, "switch-desktop", str(desktop_index), None)
+        await send_ack(
+            websocket,
+            {"name": name, "command": command, "desktopIndex": desktop_index},
+            args.debug,
+        )
+        await push_state(websocket)
+        return True
+
+    async def handle_move_window(cmd: dict, websocket) -> bool:
+        name = cmd.get("name")
+        window_id = cmd.get("window_id")
+        target_monitor = cmd.get("target_monitor")
+        target_desktop = cmd.get("target_desktop")
+        if not (window_id and target_desktop):
+            return False
+        commands = []
+        payload_state = await build_state()
+        state_index = index_payload_state(payload_state)
+        should_pin = is_monitor_all_pinned(payload_state, target_monitor, state_index)
+        window_pinned = find_window_pinned(payload_state, window_id, state_index)
+        was_fullscreen = find_window_fullscreen(payload_state, window_id, state_index)
+        if target_monitor:
+            current_monitor = find_window_monitor(payload_state, window_id, state_index)
+            if current_monitor is None or int(current_monitor) != int(target_monitor):
+                commands.append(f"kwin activate {window_id}")
+                await run_action(None, window_id, "activate", None, None)
+                await asyncio.sleep(0.2)
+                shortcut_name = None
+                if str(target_monitor).isdigit():
+                    shortcut_name = await try_screen_shortcut(int(target_monitor))
+                if shortcut_name:
+                    commands.append(f"kwin shortcut {shortcut_name}")
+                else:
+                    commands.append(f"kwin move-monitor {window_id} {target_monitor}")
+                    await run_action(None, window_id, "move-monitor", None, str(target_monitor))
+        commands.append(f"kwin move-desktop {window_id} {target_desktop}")
+        await run_action(None, window_id, "move-desktop", str(target_desktop), None)
+        if should_pin and window_pinned is False:
+            commands.append(f"kwin pin-toggle {window_id}")
+            await run_action(None, window_id, "pin-toggle", None, None)
+        commands.append(f"kwin activate {window_id}")
+        await run_action(None, window_id, "activate", None, None)
+        # Moving never makes a window fullscreen, so only a window that was
+        # fullscreen needs a fresh look, and only at that one window.
+        if was_fullscreen:
+            _, _, moved = await collect_windows(args.pid, services, journal_since(), window_id)
+            # An older full sample from the same second may be read instead.
+            moved_win = find_window_for_id(moved, window_id)
+            if moved_win and moved_win.get("fullScreen"):
                 commands.append("kwin fullscreen")
-                run_action(None, window_id, "fullscreen", None, None)
-            await send_ack(
-                websocket,
-                {"name": name, "windowId": window_id, "command": " ; ".join(commands)},
-                args.debug,
-            )
-            await push_state(websocket)
-            return
+                await run_action(None, window_id, "fullscreen", None, None)
+        await send_ack(
+            websocket,
+            {"name": name, "windowId": window_id, "command": " ; ".join(commands)},
+            args.debug,
+        )
+        await push_state(websocket)
+        return True
+
+    # Each handler returns False when the payload lacks the fields it needs.
+    command_handlers = {
+        **{name: handle_window_action for name in WINDOW_ACTION_COMMANDS},
+        "LaunchApp": handle_launch_app,
+        "KeyEvent": handle_key_event,
+        "ActivateWindow": handle_activate_window,
+        "SwitchDesktop": handle_switch_desktop,
+        "MoveWindow": handle_move_window,
+    }
 
-        log_debug(f"unknown command: {cmd}")
+    async def handle_command(cmd: dict, websocket) -> None:
+        name = cmd.get("name")
+        # Names come straight from the client and may not even be hashable.
+        handler = command_handlers.get(name) if isinstance(name, str) else None
+        if handler is None or not await handler(cmd, websocket):
+            log_debug(f"unknown command: {cmd}")
 
     async def ws_handler(websocket):
-        last_payload_key = None
         peer = getattr(websocket, "remote_address", None)
         print(f"client connected: {peer}", flush=True)
 
@@ -1245,27 +1730,48 @@ def main():
                     cmd = parse_command_message(message)
                     if not cmd:
                         continue
-                    log_debug("command: " + json.dumps(cmd.get("raw"), ensure_ascii=False))
-                    await handle_command(cmd, websocket)
+                    log_debug("command: " + json_dumps(cmd.get("raw")))
+                    await handle_command(cmd, outbox)
+                    # This client already got a state push; wake the others.
+                    notify_state_changed(exclude=changed)
             except Exception as exc:
                 if args.debug:
                     print(f"receiver error: {exc}", flush=True)
 
-        recv_task = asyncio.create_task(receiver())
-        try:
-            while True:
-                payload = build_state()
-                payload_key = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
-                if payload_key != last_payload_key:
-                    msg = json.dumps({"type": "state", "payload": payload}, ensure_ascii=False)
+        async def sender(recv_task: asyncio.Task) -> None:
+            last_raw = None
+            idle_ticks = 0
+            # Unchanged ticks send nothing, so a closed connection is noticed
+            # through the receiver ending rather than a failed send.
+            while not recv_task.done():
+                raw = await collect_raw_state(args.pid, services)
+                # Compare the sampled KWin state itself; the payload carries a
+                # timestamp and would differ on every tick.
+                if raw != last_raw or idle_ticks >= STATE_RESYNC_TICKS:
                     try:
-                        await websocket.send(msg)
+                        await outbox.send(build_state_message(*raw))
                     except Exception:
-                        break
-                    last_payload_key = payload_key
-                await asyncio.sleep(args.interval)
+                        return
+                    last_raw = raw
+                    idle_ticks = 0
+                else:
+                    idle_ticks += 1
+                await wait_for_state_change(changed, args.interval)
+
+        changed = asyncio.Event()
+        state_waiters.add(changed)
+        outbox = QueuedSender(websocket)
+        try:
+            async with asyncio.TaskGroup() as tg:
+                writer_task = tg.create_task(outbox.run())
+                recv_task = tg.create_task(receiver())
+                await sender(recv_task)
+                # The writer never returns on its own, and the receiver is
+                # still running if a send failed first.
+                recv_task.cancel()
+                writer_task.cancel()
         finally:
-            recv_task.cancel()
+            state_waiters.discard(changed)
             print(f"client disconnected: {peer}", flush=True)
 
     async def run_ws():
@@ -1273,45 +1779,56 @@ def main():
             import websockets
         except Exception as exc:  # pragma: no cover - runtime dependency check
             raise RuntimeError("Missing 'websockets' package. Install: pip install websockets") from exc
-        async with websockets.serve(ws_handler, args.host, args.port):
-            print(f"WebSocket: ws://{args.host}:{args.port}")
-            print("Press Ctrl+C to exit.")
-            try:
+        from websockets.extensions.permessage_deflate import ServerPerMessageDeflateFactory
+
+        # State messages repeat the same keys every tick; a full-size window
+        # with context takeover lets them compress against the previous frames.
+        deflate = ServerPerMessageDeflateFactory(
+            server_no_context_takeover=False,
+            server_max_window_bits=15,
+            compress_settings={"memLevel": 9},
+        )
+        # systemctl stop/restart sends SIGTERM; turn it into a normal shutdown
+        # so finally blocks and atexit cleanup still run.
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+        signals_task = asyncio.create_task(watch_kwin_signals(notify_state_changed))
+        try:
+            async with websockets.serve(ws_handler, args.host, args.port, extensions=[deflate]):
+                print(f"WebSocket: ws://{args.host}:{args.port}")
+                print("Press Ctrl+C to exit.")
                 await asyncio.Future()
-            except asyncio.CancelledError:
-                pass
+        except asyncio.CancelledError:
+            # Ctrl+C or SIGTERM, possibly while the server was still starting.
+            pass
+        finally:
+            signals_task.cancel()
+
+    async def run_cli():
+        if action:
+            if action == "move-monitor":
+                await run_action(args.pid, winid, "activate", None, None)
+                shortcut_name = None
+                if target_monitor and target_monitor.isdigit():
+                    shortcut_name = await try_screen_shortcut(int(target_monitor))
+                if not shortcut_name:
+                    await run_action(args.pid, winid, action, None, target_monitor)
+            else:
+                await run_action(args.pid, winid, action, target_desktop, target_monitor)
+        payload = await build_state()
+        if args.pretty:
+            print(json_dumps_pretty(payload))
+        else:
+            print(json_dumps(payload))
 
     if args.ws and action:
         ap.error("Actions are not allowed in WS mode.")
     if args.ws:
         try:
-            asyncio.run(run_ws())
+            run_event_loop(run_ws())
         except KeyboardInterrupt:
             print("Shutting down.")
     else:
-        if action:
-            if action == "move-monitor":
-                run_action(args.pid, winid, "activate", None, None)
-                used_shortcut = False
-                if target_monitor and target_monitor.isdigit():
-                    n = int(target_monitor)
-                    tried = []
-                    if n >= 1:
-                        tried.append(f"Window to Screen {n - 1}")
-                    tried.append(f"Window to Screen {n}")
-                    for shortcut_name in tried:
-                        if invoke_kwin_shortcut(shortcut_name):
-                            used_shortcut = True
-                            break
-                if not used_shortcut:
-                    run_action(args.pid, winid, action, None, target_monitor)
-            else:
-                run_action(args.pid, winid, action, target_desktop, target_monitor)
-        payload = build_state()
-        if args.pretty:
-            print(json.dumps(payload, ensure_ascii=False, indent=4))
-        else:
-            print(json.dumps(payload, ensure_ascii=False))
+        run_event_loop(run_cli())
 
 if __name__ == "__main__":
     main()